@@ -12,10 +12,12 @@ Sie den vom Autor auferlegten Bedingungen zu.
 
 © 2021 Alexander Vasiliev
 """
+import array
 import math
 
 from pyb4ml.inference.factored.factored_algorithm import FactoredAlgorithm
 from pyb4ml.inference.factored.factor_tree_messages import Message, Messages
+from pyb4ml.inference.factored.kernels import factor_to_variable_log_message, log_sum_exp
 from pyb4ml.modeling.categorical.variable import Variable
 from pyb4ml.modeling.factor_graph.factor_graph import FactorGraph
 
@@ -38,11 +40,22 @@ class BP(FactoredAlgorithm):
     variable of interest, and E_1 = e_1, ..., E_k = e_k form an evidence, i.e. observed 
     values e_1, ..., e_k of random variables E_1, ..., E_k, respectively.
 
+    The messages from evidential variables only scale the distribution, so the subtrees
+    behind evidential variables are pruned from the propagation.  As a result, only the
+    part of the tree that is relevant to the query given the evidence is visited.
+
     Restrictions:  Only works with random variables with categorical value domains, only 
-    works on trees (leads to dead lock on loopy graphs).  See the Bucket Elimination (BE)
+    works on trees or on loopy graphs whose loops all pass through evidential variables 
+    (raises ValueError otherwise).  See the Bucket Elimination (BE)
     algorithm for the case of loopy graphs or a joint distribution of several query variables.
     The factors must be strictly positive because of the use of logarithms.
     
+    The logarithmic message values are stored in arrays of the given typecode:  'd' for
+    double precision (by default) or 'f' for single precision, which halves the storage
+    of each message value at the cost of the accuracy of about 1e-7.  For small domains,
+    the per-message overhead dominates, so the message caches shrink much less than by
+    half.  The distribution itself is always computed in double precision.
+
     Recommended:  When modeling, reduce the number of random variables in each factor to 
     speed up the inference runtime.  To reduce the number of variables in factors, you can, 
     for example, increase the number of variables and factors in a model.
@@ -54,33 +67,36 @@ class BP(FactoredAlgorithm):
     """
     _name = 'Belief Propagation'
 
-    def __init__(self, model: FactorGraph):
+    _typecodes = ('d', 'f')
+
+    def __init__(self, model: FactorGraph, typecode='d'):
         FactoredAlgorithm.__init__(self, model)
+        # Typecode of the arrays of logarithmic message values
+        if typecode not in BP._typecodes:
+            raise ValueError(f'typecode {typecode!r} not in {BP._typecodes}')
+        self._typecode = typecode
         # To cache the node-to-node messages
         self._factor_to_variable_messages = {}
         self._variable_to_factor_messages = {}
+        # The cached node-to-node messages given the current evidence
+        self._evidence_factor_to_variable_messages = None
+        self._evidence_variable_to_factor_messages = None
         # Query variable
         self._query_variable = None
-        # Evidence tuple
-        self._evidence_tuples = ()
-        # Whether to print loop passing and propagating node-to-node messages
+        # Evidence key
+        self._evidence_key = frozenset()
+        # Whether to print propagating node-to-node messages
         self._print_info = False
-        # Temporary buffers
-        self._from_factors = []
-        self._next_factors = []
-        self._from_variables = []
-        self._next_variables = []
-
-    @staticmethod
-    def _update_passing(from_node, to_node):
-        from_node.passed = True
-        to_node.incoming_messages_number += 1
+        # To cache the message propagation schedules toward the query variables
+        self._schedule_cache = {}
 
     def clear_message_cache(self):
         del self._factor_to_variable_messages
         del self._variable_to_factor_messages
         self._factor_to_variable_messages = {}
         self._variable_to_factor_messages = {}
+        self._evidence_factor_to_variable_messages = None
+        self._evidence_variable_to_factor_messages = None
 
     def run(self, print_info=False):
         # Check whether a query is specified
@@ -95,262 +111,218 @@ class BP(FactoredAlgorithm):
         self._create_factor_to_variable_messages_cache_if_necessary()
         # The message caching is based on evidence
         self._create_variable_to_factor_messages_cache_if_necessary()
-        # Whether to print loop passing and propagating node-to-node messages
+        # Whether to print propagating node-to-node messages
         self._print_info = print_info
         # Clear the distribution
         self._distribution = None
         # Print info if necessary
         FactoredAlgorithm._print_start(self)
-        # Compute messages from leaves and make other initializations
-        self._initialize_main_loop()
+        # The propagation toward the query does not depend on the evidential values,
+        # so its schedule is built only once for each query and evidential variables
+        schedule = self._get_schedule()
         # Run the main loop
-        # Stop condition: self._query_variable.incoming_messages_number == self._query_variable.factors_number
-        while self._get_running_condition():
-            self._loop_passing += 1
-            # Print the number of the main-loop passes
-            self._print_loop()
-            # Next initialization
-            self._from_factors = self._next_factors
-            self._next_factors = []
-            self._from_variables = self._next_variables
-            self._next_variables = []
-            for from_factor in self._from_factors:
-                self._propagate_factor_to_variable_message_not_from_leaf(from_factor)
-            for from_variable in self._from_variables:
-                self._propagate_variable_to_factor_message_not_from_leaf(from_variable)
+        for compute_message, arguments in schedule:
+            compute_message(self, *arguments)
         # Propagation stopped
         # Compute either the marginal or conditional probability distribution
         self._compute_distribution()
         # Print info if necessary
         FactoredAlgorithm._print_stop(self)
 
+    def run_batch(self, evidences, print_info=False):
+        """
+        Runs the algorithm for each evidence in evidences and returns the probability
+        distributions as functions like the pd property, in the same order.  For example,
+        algorithm.run_batch([((letter, 'l0'), ), ((letter, 'l1'), ), None]) returns the
+        distributions of the query given Letter = 'l0', Letter = 'l1', and no evidence.
+
+        This is a convenience method equivalent to setting each evidence and running
+        the algorithm, so the runs reuse the schedule and cached messages in the same
+        way.  After the batch, the evidence and distribution set before are restored,
+        also if a run fails.
+        """
+        evidence = tuple((self._inner_to_outer_variables[var], var.domain[0]) for var in self._evidence)
+        distribution = self._distribution
+        pds = []
+        try:
+            for batch_evidence in evidences:
+                if batch_evidence:
+                    self.set_evidence(*batch_evidence)
+                else:
+                    self.set_evidence(None)
+                self.run(print_info)
+                pds.append(self._get_pd(self._distribution))
+        finally:
+            # Restore the evidence and distribution also if a run fails
+            if evidence:
+                self.set_evidence(*evidence)
+            else:
+                self.set_evidence(None)
+            self._distribution = distribution
+        return tuple(pds)
+
     def _compute_distribution(self):
         # Get the incoming messages to the query
-        factor_to_query_messages = self._factor_to_variable_messages[self._evidence_tuples].get_from_nodes_to_node(
-            from_nodes=self._query_variable.factors,
+        factor_to_query_messages = self._evidence_factor_to_variable_messages.get_to_node(
             to_node=self._query_variable
         )
-        # Compute the function for the distribution
-        nn_values = {value: math.exp(
-            math.fsum(message(value) for message in factor_to_query_messages)
-        ) for value in self._query_variable.domain}
+        # Sum up the incoming message values for each query value
+        log_values = tuple(math.fsum(column) for column in zip(*factor_to_query_messages))
         # The values of the sum of the incoming messages
         # can be non-normalized to be the distribution.
         # The probability distribution must be normalized.
-        norm_const = math.fsum(nn_values[value] for value in self._query_variable.domain)
+        log_norm_const = log_sum_exp(log_values)
         # Compute the probability distribution
-        self._distribution = {(value, ): nn_values[value] / norm_const for value in self._query_variable.domain}
-        self._query_variable.passed = True
+        self._distribution = {
+            (value, ): math.exp(log_value - log_norm_const)
+            for value, log_value in zip(self._query_variable.domain, log_values)
+        }
 
     def _compute_factor_to_variable_message_from_leaf(self, from_factor, to_variable):
         # Compute the message if necessary
-        if not self._factor_to_variable_messages[self._evidence_tuples].contains(from_factor, to_variable):
+        if not self._evidence_factor_to_variable_messages.contains(from_factor, to_variable):
             # Compute the message values
-            values = {value: math.log(from_factor((to_variable, value))) for value in to_variable.domain}
+            # The log-table of the leaf factor is computed only once for all the evidences
+            log_table = from_factor.log_table
+            values = tuple(log_table[offset] for offset in from_factor.get_offsets(0))
             # Cache the message
-            message = Message(from_factor, to_variable, values)
-            self._factor_to_variable_messages[self._evidence_tuples].cache(message)
+            message = self._create_message(from_factor, to_variable, values)
+            self._evidence_factor_to_variable_messages.cache(message)
             # Print the message if necessary
-            self._print_message(message)
+            self._print_message(message, to_variable)
 
-    def _compute_factor_to_variable_message_not_from_leaf(self, from_factor, to_variable):
+    def _compute_factor_to_variable_message_not_from_leaf(self, from_factor, to_variable, pruned_axes, message_axes):
         # Compute the message if necessary
-        if not self._factor_to_variable_messages[self._evidence_tuples].contains(from_factor, to_variable):
-            # Split evidential and non-evidential variables
-            from_evidential_variables, from_non_evidential_variables = \
-                Variable.split_evidential_and_non_evidential_variables(
-                    variables=from_factor.variables,
-                    without_variables=(to_variable, )
-                )
-            # Get the incoming evidential messages
-            evidential_messages = self._variable_to_factor_messages[self._evidence_tuples].get_from_nodes_to_node(
-                from_nodes=from_evidential_variables,
-                to_node=from_factor
-            )
-            # Get the incoming non-evidential messages
-            non_evidential_messages = self._variable_to_factor_messages[self._evidence_tuples].get_from_nodes_to_node(
-                from_nodes=from_non_evidential_variables,
-                to_node=from_factor
+        if not self._evidence_factor_to_variable_messages.contains(from_factor, to_variable):
+            variable_to_factor_messages = self._evidence_variable_to_factor_messages
+            # Table offsets of the current domain values, i.e. the evidential
+            # variables contribute only the offsets of their evidential values,
+            # and the incoming message values of the other factor variables.
+            # The messages from leaf and evidential variables are taken as zero.
+            to_offsets = from_factor.get_offsets(from_factor.get_axis(to_variable))
+            incoming = [(from_factor.get_offsets(axis), None) for axis in pruned_axes]
+            incoming.extend(
+                (from_factor.get_offsets(axis), variable_to_factor_messages.get(from_variable, from_factor).values)
+                for axis, from_variable in message_axes
             )
-            # Use to reduce computational instability
-            max_message = \
-                max(message(value) for message in non_evidential_messages for value in message.from_node.domain) \
-                if len(non_evidential_messages) > 0 else 0
-            # Sum out the evidential messages separately
-            from_evidential_variables_values = tuple(variable.domain[0] for variable in from_evidential_variables)
-            evidential_messages_sum = math.fsum(msg(val) for msg, val
-                                                in zip(evidential_messages, from_evidential_variables_values))
-            # Cross product of domains
-            evaluated_non_evidential_variables_values = \
-                Variable.evaluate_variables(from_non_evidential_variables)
             # Compute the message values
-            values = {value: evidential_messages_sum + max_message + math.log(
-                              math.fsum(
-                                  from_factor(
-                                      *zip(from_non_evidential_variables, non_evidential_variables_values),
-                                      (to_variable, value)
-                                  )
-                                  * math.exp(
-                                      math.fsum(
-                                          msg(val) for msg, val
-                                          in zip(non_evidential_messages, non_evidential_variables_values)
-                                      ) - max_message
-                                  )
-                                  for non_evidential_variables_values in evaluated_non_evidential_variables_values
-                              )
-                          ) for value in to_variable.domain}
+            values = factor_to_variable_log_message(from_factor.log_table, to_offsets, incoming)
             # Cache the message
-            message = Message(from_factor, to_variable, values)
-            self._factor_to_variable_messages[self._evidence_tuples].cache(message)
+            message = self._create_message(from_factor, to_variable, values)
+            self._evidence_factor_to_variable_messages.cache(message)
             # Print the message if necessary
-            self._print_message(message)
-
-    def _compute_variable_to_factor_message_from_leaf(self, from_variable, to_factor):
-        # Compute the message if necessary
-        if not self._variable_to_factor_messages[self._evidence_tuples].contains(from_variable, to_factor):
-            # Compute the message values
-            values = {value: 0 for value in from_variable.domain}
-            # Cache the message
-            message = Message(from_variable, to_factor, values)
-            self._variable_to_factor_messages[self._evidence_tuples].cache(message)
-            # Print the message if necessary
-            self._print_message(message)
+            self._print_message(message, to_variable)
 
     def _compute_variable_to_factor_message_not_from_leaf(self, from_variable, to_factor):
         # Compute the message if necessary
-        if not self._variable_to_factor_messages[self._evidence_tuples].contains(from_variable, to_factor):
-            from_factors = tuple(factor for factor in from_variable.factors if factor is not to_factor)
+        if not self._evidence_variable_to_factor_messages.contains(from_variable, to_factor):
             # Compute the message values
-            # Only one non-passed factor
-            # from_variable was previously to_variable
-            values = {value: math.fsum(message(value) for message in
-                                       self._factor_to_variable_messages[self._evidence_tuples].get_from_nodes_to_node(
-                                           from_nodes=from_factors,
-                                           to_node=from_variable)
-                                       ) for value in from_variable.domain}
+            # from the messages of all the other factors
+            factor_to_variable_messages = self._evidence_factor_to_variable_messages.get_to_node(
+                to_node=from_variable,
+                without_node=to_factor
+            )
+            if len(factor_to_variable_messages) == 1:
+                # The only message is passed on
+                values = factor_to_variable_messages[0]
+            else:
+                # The logarithmic messages are well-scaled, so a plain sum is accurate enough
+                values = tuple(map(sum, zip(*factor_to_variable_messages)))
             # Cache the message
-            message = Message(from_variable, to_factor, values)
-            self._variable_to_factor_messages[self._evidence_tuples].cache(message)
+            message = self._create_message(from_variable, to_factor, values)
+            self._evidence_variable_to_factor_messages.cache(message)
             # Print the message if necessary
-            self._print_message(message)
+            self._print_message(message, from_variable)
+
+    def _create_message(self, from_node, to_node, values):
+        return Message(from_node, to_node, array.array(self._typecode, values))
 
     def _create_factor_to_variable_messages_cache_if_necessary(self):
-        if self._evidence_tuples not in self._factor_to_variable_messages:
+        if self._evidence_key not in self._factor_to_variable_messages:
             # Cache if not cached
-            self._factor_to_variable_messages[self._evidence_tuples] = Messages()
+            self._factor_to_variable_messages[self._evidence_key] = Messages()
+        # Look up the cache only once per run
+        self._evidence_factor_to_variable_messages = self._factor_to_variable_messages[self._evidence_key]
 
     def _create_variable_to_factor_messages_cache_if_necessary(self):
-        if self._evidence_tuples not in self._variable_to_factor_messages:
+        if self._evidence_key not in self._variable_to_factor_messages:
             # Cache if not cached
-            self._variable_to_factor_messages[self._evidence_tuples] = Messages()
-
-    def _extend_next_variables(self, variable):
-        # If the variable is query, the propagation should be stopped here
-        if variable is not self._query_variable:
-            # If all messages except one are collected,
-            # then a message can be propagated from this variable
-            # to the next factor
-            if variable.incoming_messages_number + 1 == variable.factors_number:
-                self._next_variables.append(variable)
-
-    def _extend_next_factors(self, factor):
-        # If all messages except one are collected,
-        # then a message can be propagated from this factor
-        # to the next variable
-        if factor.incoming_messages_number + 1 == factor.variables_number:
-            self._next_factors.append(factor)
-
-    def _get_running_condition(self):
-        return self._query_variable.incoming_messages_number < self._query_variable.factors_number
-
-    def _initialize_factor_passing(self):
-        # There are no passed factors
-        for factor in self.factors:
-            factor.passed = False
-            factor.incoming_messages_number = 0
-
-    def _initialize_main_loop(self):
-        self._loop_passing = 0
-        # Print the loop information if necessary
-        self._print_loop()
-        # The factors to which the message propagation goes further
-        self._next_factors = []
-        # The variables to which the message propagation goes further
-        self._next_variables = []
-        # There are no passed factors and no incoming messages
-        self._initialize_factor_passing()
-        # There are no passed variables and no incoming messages
-        self._initialize_variable_passing()
-        # Propagation from factor leaves
-        self._propagate_factor_to_variable_messages_from_leaves()
-        # Propagation from variable leaves
-        self._propagate_variable_to_factor_messages_from_leaves()
-
-    def _initialize_variable_passing(self):
-        # There are no passed variables
-        for variable in self.variables:
-            variable.passed = False
-            variable.incoming_messages_number = 0
-
-    def _propagate_factor_to_variable_messages_from_leaves(self):
-        for from_factor in self._inner_model.factor_leaves:
-            # The leaf factor has only one variable
-            to_variable = from_factor.variables[0]
-            self._compute_factor_to_variable_message_from_leaf(from_factor, to_variable)
-            # Update passed nodes und incoming messages number
-            self._update_passing(from_factor, to_variable)
-            # If all messages except one are collected,
-            # then a message can be propagated from this variable
-            # to the next factor
-            self._extend_next_variables(to_variable)
-
-    def _propagate_factor_to_variable_message_not_from_leaf(self, from_factor):
-        # The factor-to-variable message to the only one variable that is non-passed
-        to_variable, = (variable for variable in from_factor.variables if not variable.passed)
-        self._compute_factor_to_variable_message_not_from_leaf(from_factor, to_variable)
-        # Update passed nodes und incoming messages number
-        self._update_passing(from_factor, to_variable)
-        # If all messages except one are collected,
-        # then a message can be propagated from the next factor
-        # to the next variable
-        self._extend_next_variables(to_variable)
-
-    def _propagate_variable_to_factor_messages_from_leaves(self):
-        for from_variable in self._inner_model.variable_leaves:
-            if from_variable is self._query_variable:
+            self._variable_to_factor_messages[self._evidence_key] = Messages()
+        # Look up the cache only once per run
+        self._evidence_variable_to_factor_messages = self._variable_to_factor_messages[self._evidence_key]
+
+    def _build_schedule(self):
+        # The messages are scheduled in the post-order of the depth-first search
+        # from the query variable, so that each message follows all the messages
+        # it depends on.  Each node is visited once, which is enough on a tree.
+        schedule = []
+        visited = {self._query_variable}
+        # Nodes with the neighbors to which they send messages
+        # and whether their incoming messages are already scheduled
+        stack = [(self._query_variable, None, False)]
+        while stack:
+            from_node, to_node, expanded = stack.pop()
+            if expanded:
+                if to_node is not None:
+                    schedule.append(BP._get_message_computation(from_node, to_node))
                 continue
-            # The leaf variable has only one factor
-            to_factor = from_variable.factors[0]
-            self._compute_variable_to_factor_message_from_leaf(from_variable, to_factor)
-            # Update passed nodes und incoming messages number
-            self._update_passing(from_variable, to_factor)
-            # If all messages except one are collected,
-            # then a message can be propagated from this factor
-            # to the next variable
-            self._extend_next_factors(to_factor)
-
-    def _propagate_variable_to_factor_message_not_from_leaf(self, from_variable):
-        # The variable-to-factor message to the only one factor that is non-passed
-        to_factor, = (factor for factor in from_variable.factors if not factor.passed)
-        self._compute_variable_to_factor_message_not_from_leaf(from_variable, to_factor)
-        # Update passed nodes und incoming messages number
-        self._update_passing(from_variable, to_factor)
-        # If all messages except one are collected,
-        # then a message can be propagated from the next factor
-        # to the next variable
-        self._extend_next_factors(to_factor)
+            stack.append((from_node, to_node, True))
+            neighbors = from_node.factors if isinstance(from_node, Variable) else from_node.variables
+            for neighbor in neighbors:
+                if neighbor is to_node or BP._is_pruned(neighbor):
+                    continue
+                if neighbor in visited:
+                    raise ValueError(f'the factor graph is not a tree: node {neighbor} is reachable '
+                                     f'from query variable {self._query_variable.name} in several ways')
+                visited.add(neighbor)
+                stack.append((neighbor, from_node, False))
+        return tuple(schedule)
+
+    def _get_schedule(self):
+        # The pruning depends on the evidential variables but not on their values
+        key = (self._query_variable, self._evidence)
+        if key not in self._schedule_cache:
+            self._schedule_cache[key] = self._build_schedule()
+        return self._schedule_cache[key]
 
-    def _print_loop(self):
-        if self._print_info:
-            print()
-            print('loop passing:', self._loop_passing)
-            print()
+    @staticmethod
+    def _is_pruned(node):
+        # The messages from leaf variables are zero.  The messages from evidential
+        # variables have only one value, which adds the same constant to all the values
+        # of the next messages and cancels out in the normalization of the distribution.
+        # Therefore, these messages are taken as zero and the subtrees behind evidential
+        # variables are not visited at all.
+        return isinstance(node, Variable) and (node.is_leaf() or node.is_evidential())
 
-    def _print_message(self, message):
+    @staticmethod
+    def _get_message_computation(from_node, to_node):
+        """
+        Returns the method computing the message and its arguments
+        """
+        if isinstance(from_node, Variable):
+            return BP._compute_variable_to_factor_message_not_from_leaf, (from_node, to_node)
+        elif from_node.is_leaf():
+            return BP._compute_factor_to_variable_message_from_leaf, (from_node, to_node)
+        else:
+            # The schedule depends on the evidential variables, so the factor variables
+            # can be split into the pruned and message-sending ones only once
+            pruned_axes = []
+            message_axes = []
+            for axis, variable in enumerate(from_node.variables):
+                if variable is not to_node:
+                    if BP._is_pruned(variable):
+                        pruned_axes.append(axis)
+                    else:
+                        message_axes.append((axis, variable))
+            return BP._compute_factor_to_variable_message_not_from_leaf, \
+                (from_node, to_node, tuple(pruned_axes), tuple(message_axes))
+
+    def _print_message(self, message, variable):
         # Print the message if necessary
         if self._print_info:
+            # The message values are indexed by the positions of the variable values
             print(message)
             print('logarithmic message value:')
-            print(message.values)
+            print(dict(zip(variable.domain, message.values)))
             print('message values:')
-            print({key: math.exp(value) for key, value in message.values.items()})
+            print({value: math.exp(log_value) for value, log_value in zip(variable.domain, message.values)})
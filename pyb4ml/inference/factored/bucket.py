@@ -1,5 +1,4 @@
-import math
-
+from pyb4ml.inference.factored.kernels import log_sum_exp
 from pyb4ml.modeling import Factor
 from pyb4ml.modeling.categorical.variable import Variable
 
@@ -10,6 +9,7 @@ class Bucket:
         self._input_log_factors = []
         self._evidential_variables = ()
         self._free_variables = ()
+        self._reduced_log_tables = []
 
     @property
     def free_variables(self):
@@ -33,40 +33,21 @@ class Bucket:
         return len(self._free_variables) > 0
 
     def compute_output_log_factor(self):
-        # Evaluate free variables
-        free_variables_values = Variable.evaluate_variables(self._free_variables)
-        # Compute the function for the output factor
-        function_value_dict = {}
-        for free_values in free_variables_values:
-            # Zip the free variables with their values
-            free_variables_with_values = tuple(zip(self._free_variables, free_values))
-            # Save the values of the log-factors depending on the values of the summing variable
-            input_log_factors = {
-                value:
-                    tuple(
-                        log_factor(
-                            *log_factor.filter_values(*free_variables_with_values), (self._variable, value)
-                        ) for log_factor in self._input_log_factors
-                    ) for value in self._variable.domain
-                }
-            # Get the maximum log-factor for computational stability
-            max_log_factor = max(max(input_log_factors[value]) for value in self._variable.domain)
-            # Save the values of the function for the output log-factor
-            function_value_dict[free_values] = max_log_factor + math.log(
-                math.fsum(
-                    math.exp(
-                        math.fsum(input_log_factors[value]) - max_log_factor
-                    ) for value in self._variable.domain
-                )
-            )
-        # Return the log-factor unliked to its variables
+        # Sum up the reduced log-tables over the free and bucket variables
+        log_table = tuple(map(sum, zip(*self._reduced_log_tables)))
+        # Sum out the bucket variable, which is the last table axis
+        size = len(self._variable.domain)
+        output_log_table = tuple(log_sum_exp(log_table[index:index + size])
+                                 for index in range(0, len(log_table), size))
+        # Return the log-factor unliked to its variables,
+        # which is given by its table only
         log_factor = Factor(
             variables=self._free_variables,
-            function=lambda *values: function_value_dict[values],
             name='log_f_' + self._variable.name,
             evidence=self._evidential_variables,
             variable_linking=False
         )
+        log_factor.set_table(output_log_table)
         return log_factor
 
     def set_evidential_and_free_variables(self):
@@ -74,3 +55,11 @@ class Bucket:
         self._evidential_variables, self._free_variables = \
             Variable.split_evidential_and_non_evidential_variables(bucket_variables, (self._variable, ))
         self._free_variables = tuple(sorted(self._free_variables, key=lambda x: x.name))
+        # The evidence is fixed in the bucket, so the input log-factors
+        # can be reduced to the free and bucket variables only once
+        self._set_reduced_log_tables()
+
+    def _set_reduced_log_tables(self):
+        # Table axes: the free variables followed by the bucket variable
+        variables = self._free_variables + (self._variable, )
+        self._reduced_log_tables = [log_factor.reduce_table(variables) for log_factor in self._input_log_factors]
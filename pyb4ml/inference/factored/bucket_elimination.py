@@ -16,6 +16,8 @@ import math
 
 from pyb4ml.inference.factored.bucket import Bucket
 from pyb4ml.inference.factored.factored_algorithm import FactoredAlgorithm
+from pyb4ml.inference.factored.greedy_ordering import GO
+from pyb4ml.inference.factored.kernels import log_sum_exp
 from pyb4ml.modeling import FactorGraph
 from pyb4ml.modeling.categorical.variable import Variable
 
@@ -51,6 +53,11 @@ class BE(FactoredAlgorithm):
     The factors must be strictly positive because of the use of logarithms.  The query and
     elimination variables must be disjoint.
 
+    If no elimination ordering is set, a near-optimal one is found by the Greedy Ordering (GO)
+    algorithm with the cost criterion of "weighted-min-fill" for the query and evidential
+    variables.  Thus, the cardinality of the free variables of a bucket stays close to
+    the induced width of the graph instead of growing up to the number of all the variables.
+
     Recommended:  Use the algorithm for loopy factor graphs or for computing a joint 
     distribution of query variables, otherwise use the Belief Propagation (BP) algorithm.
     
@@ -66,6 +73,11 @@ class BE(FactoredAlgorithm):
         self._computed_log_factors = []
         self._bucket_cache = {}
         self._elimination_ordering = []
+        # Whether to find an elimination ordering by the GO algorithm
+        self._greedy_elimination = True
+        # The GO algorithm and the orderings found by it
+        self._greedy_ordering = None
+        self._greedy_ordering_cache = {}
         self._print_info = False
         # Logarithm all the model factors
         self._logarithm_factors()
@@ -97,6 +109,9 @@ class BE(FactoredAlgorithm):
     def run(self, print_info=False):
         # Check whether a query is specified
         FactoredAlgorithm.check_non_empty_query(self)
+        # Find an elimination ordering if it is not set
+        if self._greedy_elimination:
+            self._set_greedy_elimination()
         # Query, evidence, and elimination ordering variables must be disjoint and build a whole model
         self.check_variable_partition()
         # Print the bucket information
@@ -143,6 +158,7 @@ class BE(FactoredAlgorithm):
                                  f'in the elimination ordering')
             elm_ordering.append(inner_var)
         self._elimination_ordering = tuple(elm_ordering)
+        self._greedy_elimination = False
 
     def _add_computed_log_factors_to_bucket_cache(self, variable):
         bucket = self._bucket_cache[variable]
@@ -165,23 +181,19 @@ class BE(FactoredAlgorithm):
             # Assemble all the log-factors from the query buckets
             log_factors.extend(self._bucket_cache[query_variable].input_log_factors)
         query_variables_values = Variable.evaluate_variables(self._query)
-        # Compute the function for the distribution
-        nn_values = {}
-        for query_values in query_variables_values:
-            query_variables_with_values = tuple(zip(self._query, query_values))
-            nn_values[query_values] = math.exp(
-                math.fsum(
-                    log_factor(
-                        *log_factor.filter_values(*query_variables_with_values)) for log_factor in log_factors
-                    )
-                )
+        # Compute the logarithm of the function for the distribution
+        # from the log-factor tables reduced to the query variables
+        log_tables = tuple(log_factor.reduce_table(self._query) for log_factor in log_factors)
+        log_values = tuple(math.fsum(column) for column in zip(*log_tables)) \
+            if log_tables \
+            else (0, ) * len(query_variables_values)
         # The values of the sum can be non-normalized to be the distribution.
         # The probability distribution must be normalized.
-        norm_const = math.fsum(nn_values[query_values] for query_values in query_variables_values)
+        log_norm_const = log_sum_exp(log_values)
         # Compute the probability distribution
         self._distribution = {
-            query_values:
-                nn_values[query_values] / norm_const for query_values in query_variables_values
+            query_values: math.exp(log_value - log_norm_const)
+            for query_values, log_value in zip(query_variables_values, log_values)
         }
 
     def _compute_output_log_factor(self, variable):
@@ -229,6 +241,29 @@ class BE(FactoredAlgorithm):
             # Logarithm the factor
             factor.logarithm()
 
+    def _set_greedy_elimination(self):
+        # The ordering depends only on the query and evidential variables
+        # but not on the evidential values
+        key = (self._query, self._evidence)
+        if key not in self._greedy_ordering_cache:
+            if self._greedy_ordering is None:
+                # The GO algorithm works on its own copy of the model instead of the inner model,
+                # since it sets its own evidence and the neighbors of its variables, which must
+                # not change the BE variables.  It is created once and reused for all the runs.
+                self._greedy_ordering = GO(self._outer_model)
+            self._greedy_ordering.set_query(*(self._inner_to_outer_variables[var] for var in self._query))
+            if self._evidence:
+                self._greedy_ordering.set_evidence(
+                    *((self._inner_to_outer_variables[var], var.domain[0]) for var in self._evidence)
+                )
+            else:
+                self._greedy_ordering.set_evidence(None)
+            self._greedy_ordering.run(cost='weighted-min-fill')
+            self._greedy_ordering_cache[key] = tuple(
+                self._outer_to_inner_variables[var] for var in self._greedy_ordering.ordering
+            )
+        self._elimination_ordering = self._greedy_ordering_cache[key]
+
     def _print_bucket(self, bucket):
         if self._print_info:
             print()
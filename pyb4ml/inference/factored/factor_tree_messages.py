@@ -1,12 +1,14 @@
+from pyb4ml.modeling.categorical.variable import Variable
+
+
 class Message:
+    __slots__ = ('_from_node', '_to_node', '_values')
+
     def __init__(self, from_node, to_node, values):
         self._from_node = from_node
         self._to_node = to_node
         self._values = values
 
-    def __call__(self, value):
-        return self._values[value]
-
     def __str__(self):
         return f'Message: {self._from_node} -> {self._to_node}'
 
@@ -24,23 +26,52 @@ class Message:
 
 
 class Messages:
+    __slots__ = ('_buffers', )
+
     def __init__(self):
-        self._messages = {}
+        # The incoming messages of each node are kept in a buffer
+        # with one slot per neighbor, i.e. per factor of a variable
+        # or per variable of a factor
+        self._buffers = {}
+
+    @staticmethod
+    def _get_slot(from_node, to_node):
+        # The factors of a variable are addressed by their indices
+        # and the variables of a factor by their table axes
+        if isinstance(to_node, Variable):
+            return to_node.get_factor_index(from_node)
+        else:
+            return to_node.get_axis(from_node)
 
     def __contains__(self, message):
-        return (message.from_node, message.to_node) in self._messages
+        return self.contains(message.from_node, message.to_node)
 
     def __iter__(self):
-        return iter(self._messages)
+        return ((message.from_node, message.to_node)
+                for buffer in self._buffers.values()
+                for message in buffer if message is not None)
 
     def cache(self, message):
-        self._messages[(message.from_node, message.to_node)] = message
+        to_node = message.to_node
+        buffer = self._buffers.get(to_node)
+        if buffer is None:
+            size = to_node.factors_number if isinstance(to_node, Variable) else to_node.variables_number
+            buffer = self._buffers[to_node] = [None] * size
+        buffer[Messages._get_slot(message.from_node, to_node)] = message
 
     def contains(self, from_node, to_node):
-        return (from_node, to_node) in self._messages
+        buffer = self._buffers.get(to_node)
+        return buffer is not None and buffer[Messages._get_slot(from_node, to_node)] is not None
 
     def get(self, from_node, to_node):
-        return self._messages[(from_node, to_node)]
+        return self._buffers[to_node][Messages._get_slot(from_node, to_node)]
 
-    def get_from_nodes_to_node(self, from_nodes, to_node):
-        return list(self._messages[(from_node, to_node)] for from_node in from_nodes)
\ No newline at end of file
+    def get_to_node(self, to_node, without_node=None):
+        """
+        Returns the values of all the cached messages to the node except the message
+        from without_node
+        """
+        buffer = self._buffers[to_node]
+        without_index = Messages._get_slot(without_node, to_node) if without_node is not None else None
+        return tuple(message.values for index, message in enumerate(buffer)
+                     if message is not None and index != without_index)
@@ -23,8 +23,8 @@ class FactoredAlgorithm:
         self._query = ()
         # Evidential variables not specified
         self._evidence = ()
-        # Evidence tuples of (var, val) not specified
-        self._evidence_tuples = ()
+        # Evidence key of (var, val) pairs not specified
+        self._evidence_key = frozenset()
         # Probability distribution P(query) or P(query|evidence) not specified
         self._distribution = None
 
@@ -76,17 +76,7 @@ class FactoredAlgorithm:
         probability distribution. 
         """
         if self._distribution is not None:
-            def distribution(*values):
-                if len(values) != len(self._query):
-                    raise ValueError(
-                        f'the number {len(values)} of given values does not match '
-                        f'the number {len(self._query)} of query variables'
-                    )
-                for variable, value in zip(self._query, values):
-                    if value not in variable.domain:
-                        raise ValueError(f'value {value!r} not in domain {variable.domain} of {variable.name}')
-                return self._distribution[values]
-            return distribution
+            return self._get_pd(self._distribution)
         else:
             raise AttributeError('distribution not computed')
 
@@ -161,7 +151,7 @@ class FactoredAlgorithm:
             self._set_evidence(*evidence)
         else:
             self._evidence = ()
-        self._set_evidence_tuples()
+        self._set_evidence_key()
     
     def set_query(self, *variables):
         """
@@ -189,6 +179,21 @@ class FactoredAlgorithm:
         del self._evidence
         self._evidence = ()
 
+    def _get_pd(self, distribution):
+        query = self._query
+
+        def pd(*values):
+            if len(values) != len(query):
+                raise ValueError(
+                    f'the number {len(values)} of given values does not match '
+                    f'the number {len(query)} of query variables'
+                )
+            for variable, value in zip(query, values):
+                if value not in variable.domain:
+                    raise ValueError(f'value {value!r} not in domain {variable.domain} of {variable.name}')
+            return distribution[values]
+        return pd
+
     def _print_start(self):
         if self._print_info:
             print('*' * 40)
@@ -228,8 +233,9 @@ class FactoredAlgorithm:
             )
         )
 
-    def _set_evidence_tuples(self):
-        self._evidence_tuples = tuple((var, var.domain[0]) for var in self._evidence)
+    def _set_evidence_key(self):
+        # The key does not depend on the order in which the evidence is given
+        self._evidence_key = frozenset((var, var.domain[0]) for var in self._evidence)
 
     def _set_query(self, *query_variables):
         # Check whether the query has duplicates
@@ -10,6 +10,8 @@ class GBE(GO, BE):
         GO.__init__(self, model)
         # Logarithm all the model factors
         BE._logarithm_factors(self)
+        # The elimination ordering is always found and cached here
+        self._greedy_elimination = False
         self._ordering_cache = {}
 
     def clear_ordering_cache(self):
@@ -174,11 +174,15 @@ class GO(FactoredAlgorithm):
             print(f'total_cost({variable.name}) = {cost}\n')
 
     def _set_neighbors(self):
-        for variable in self.non_evidential:
-            variable.neighbors = list(
-                set(var
-                    for factor in variable.factors
-                    for var in factor.variables
-                    if var is not variable and not var.is_evidential()
-                    )
-            )
+        # A variable with a one-value domain can be an elimination variable if it is
+        # not in the evidence, so the evidence is not detected by the domain size
+        evidence = set(self._evidence)
+        for variable in self.variables:
+            if variable not in evidence:
+                variable.neighbors = list(
+                    set(var
+                        for factor in variable.factors
+                        for var in factor.variables
+                        if var is not variable and var not in evidence
+                        )
+                )
@@ -0,0 +1,62 @@
+"""
+The module contains the computational kernels shared by the factored algorithms.
+The kernels work on flat tables of logarithmic factor values and on tuples of
+logarithmic message values, so they do not depend on the factor graph objects.
+
+Attention:  The author is not responsible for any damage that can be caused by the use
+of this code.  You use this code at your own risk.  Any claim against the author is
+legally void.  By using this code, you agree to the terms imposed by the author.
+
+Achtung:  Der Autor haftet nicht für Schäden, die durch die Verwendung dieses Codes
+entstehen können.  Sie verwenden dieses Code auf eigene Gefahr.  Jegliche Ansprüche
+gegen den Autor sind rechtlich nichtig.  Durch die Verwendung dieses Codes stimmen
+Sie den vom Autor auferlegten Bedingungen zu.
+
+© 2021 Alexander Vasiliev
+"""
+import math
+
+
+def log_sum_exp(values):
+    """
+    Computes log(exp(v_1) + ... + exp(v_n)) subtracting the maximum value
+    before exponentiating for computational stability
+    """
+    max_value = max(values)
+    return max_value + math.log(math.fsum(math.exp(value - max_value) for value in values))
+
+
+def factor_to_variable_log_message(log_table, to_offsets, incoming):
+    """
+    Computes the logarithmic values of a factor-to-variable message.
+
+    log_table is the flat row-major table of the logarithmic factor values, to_offsets
+    are the table offsets of the values of the variable the message goes to, and incoming
+    is a sequence of pairs (offsets, log_values) of the table offsets and logarithmic
+    message values of each other factor variable, where log_values of None means a zero
+    message, e.g. from a leaf variable.  The message value for each offset in
+    to_offsets is the log-sum-exp of the log-factor plus the sum of the incoming messages
+    over the Cartesian product of the incoming variable values.
+    """
+    # The incoming variables with only one value, e.g. the evidential variables,
+    # shift the table offsets and add the same value to all the terms, so they
+    # are summed up outside of the log-sum-exp
+    base_offset = 0
+    base_log_value = 0
+    # Pairs of the table offsets and message sums
+    # over the Cartesian product of the incoming variable values
+    terms = ((0, 0), )
+    for offsets, log_values in incoming:
+        if log_values is None:
+            log_values = (0, ) * len(offsets)
+        if len(offsets) == 1:
+            base_offset += offsets[0]
+            base_log_value += log_values[0]
+        else:
+            axis_terms = tuple(zip(offsets, log_values))
+            terms = tuple((offset + axis_offset, message_sum + log_value)
+                          for offset, message_sum in terms
+                          for axis_offset, log_value in axis_terms)
+    return tuple(base_log_value + log_sum_exp(tuple(log_table[base_offset + to_offset + offset] + message_sum
+                                                    for offset, message_sum in terms))
+                 for to_offset in to_offsets)
@@ -1,3 +1,4 @@
+import functools
 import itertools
 
 from pyb4ml.modeling.common.named_element import NamedElement
@@ -8,17 +9,25 @@ class Variable(NamedElement):
         NamedElement.__init__(self, name)
         self._domain = tuple(sorted(set(domain))) if domain is not None else None
         self._linked_factors = []
+        # Indices of the linked factors
+        self._factor_index = {}
 
     @staticmethod
     def evaluate_variables(variables):
-        domains = (variable.domain for variable in variables)
-        return tuple(itertools.product(*domains))
+        """
+        Returns the Cartesian product of the variable domains.  The products are cached
+        by the domains and not by the variables, since setting an evidence changes them.
+        Only the most recently used products are kept, since the cache is shared by all
+        the models in the process.
+        """
+        return _evaluate_domains(tuple(variable.domain for variable in variables))
 
     @staticmethod
     def split_evidential_and_non_evidential_variables(variables, without_variables=()):
         """
         Splits evidential and non-evidential variables ignoring without_variables
         """
+        without_variables = set(without_variables)
         evidential_variables = []
         non_evidential_variables = []
         for variable in variables:
@@ -45,6 +54,12 @@ class Variable(NamedElement):
         if self.is_value_illegal(value):
             raise ValueError(f'variable {self.name} cannot have the value of {value}')
 
+    def get_factor_index(self, factor):
+        return self._factor_index[factor]
+
+    def index_factors(self):
+        self._factor_index = {factor: index for index, factor in enumerate(self._linked_factors)}
+
     def is_evidential(self):
         return len(self._domain) == 1
 
@@ -62,3 +77,8 @@ class Variable(NamedElement):
 
     def set_domain(self, domain):
         self._domain = tuple(sorted(set(domain)))
+
+
+@functools.lru_cache(maxsize=128)
+def _evaluate_domains(domains):
+    return tuple(itertools.product(*domains))
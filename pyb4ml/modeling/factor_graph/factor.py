@@ -1,3 +1,4 @@
+import itertools
 import math
 
 from pyb4ml.modeling.categorical.variable import Variable
@@ -14,8 +15,16 @@ class Factor(NamedElement):
     def __init__(self, variables, function=None, name=None, evidence=None, variable_linking=True):
         NamedElement.__init__(self, name)
         self._variables = tuple(variables)
+        # Axes of the variables in the factor table
+        self._axes = {variable: axis for axis, variable in enumerate(self._variables)}
         self._function = function
         self._evidence_var_val_dict = {}
+        # Factor values on the Cartesian product of the variable domains
+        self._table = None
+        self._log_table = None
+        self._domains = None
+        self._value_indices = None
+        self._strides = None
         if variable_linking:
             self._link_factor_to_variables()
         self._set_evidence(evidence)
@@ -39,6 +48,19 @@ class Factor(NamedElement):
     def function(self):
         return self._function
 
+    @property
+    def log_table(self):
+        """
+        Returns the logarithms of the table values, computed once and then cached
+        """
+        if self._log_table is None:
+            self._log_table = tuple(math.log(value) for value in self._table)
+        return self._log_table
+
+    @property
+    def table(self):
+        return self._table
+
     @property
     def variables(self):
         return self._variables
@@ -72,15 +94,70 @@ class Factor(NamedElement):
         except KeyError:
             raise ValueError(f'variable {variable.name} is not evidential')
 
-    def filter_values(self, *variables_with_values):
-        return tuple(var_val for var_val in variables_with_values if var_val[0] in self._variables)
+    def get_offsets(self, axis):
+        """
+        Returns the table offsets of the current domain values of the variable on the axis.
+        The domain of an evidential variable is reduced to one value, so only the offset
+        of that value is returned.
+        """
+        stride = self._strides[axis]
+        value_index = self._value_indices[axis]
+        return tuple(value_index[value] * stride for value in self._variables[axis].domain)
+
+    def get_axis(self, variable):
+        return self._axes[variable]
 
     def is_leaf(self):
         return len(self._variables) == 1
 
+    def materialize(self):
+        """
+        Evaluates the factor function on the Cartesian product of the variable domains
+        and stores the values in a flat table in row-major order
+        """
+        if self._function is not None:
+            domains = (variable.domain for variable in self._variables)
+            self.set_table(tuple(self._function(*values) for values in itertools.product(*domains)))
+
     def logarithm(self):
         self._function = log(self._function)
         self._name = 'log_' + self._name
+        if self._table is not None:
+            self._table = self.log_table
+            self._log_table = None
+
+    def reduce_table(self, variables):
+        """
+        Returns the flat table in row-major order on the Cartesian product of the current
+        domains of the variables.  The factor values are broadcast along the variables the
+        factor does not depend on.  The factor variables not in variables must be evidential,
+        so that only their evidential values are taken.
+        """
+        offsets = (sum(self.get_offsets(axis)[0] for variable, axis in self._axes.items()
+                       if variable not in variables), )
+        for variable in variables:
+            axis = self._axes.get(variable)
+            axis_offsets = self.get_offsets(axis) if axis is not None else (0, ) * len(variable.domain)
+            offsets = tuple(offset + axis_offset for offset in offsets for axis_offset in axis_offsets)
+        return tuple(self._table[offset] for offset in offsets)
+
+    def set_table(self, table):
+        """
+        Sets the factor values on the Cartesian product of the current variable domains
+        given in a flat table in row-major order
+        """
+        self._domains = tuple(variable.domain for variable in self._variables)
+        self._value_indices = tuple(
+            {value: index for index, value in enumerate(domain)} for domain in self._domains
+        )
+        strides = []
+        stride = 1
+        for domain in reversed(self._domains):
+            strides.append(stride)
+            stride *= len(domain)
+        self._strides = tuple(reversed(strides))
+        self._table = tuple(table)
+        self._log_table = None
 
     def _link_factor_to_variables(self):
         for var in self._variables:
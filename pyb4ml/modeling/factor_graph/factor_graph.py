@@ -11,6 +11,13 @@ class FactorGraph:
                 ),
             key=lambda v: v.name
         )
+        # Tabulate the factor values on the variable domains
+        for factor in self._factors:
+            factor.materialize()
+        # Number the factors of each variable to address the node-to-node messages by slots,
+        # the variables of each factor are numbered by their axes
+        for variable in self._variables:
+            variable.index_factors()
         self._factor_dict = None
         self._variable_dict = None
 
@@ -8,6 +8,8 @@ if package_dir not in sys.path:
     sys.path.insert(0, package_dir)
 
 from pyb4ml.inference import BE
+from pyb4ml.modeling import Factor, FactorGraph
+from pyb4ml.modeling.categorical.variable import Variable
 from pyb4ml.models import Student
 
 # Test the Bucket Elimination algorithm on the Student model
@@ -570,3 +572,42 @@ assert 0.4205178 / (1 + eps) <= pd('l0', 's0') <= 0.4205178 * (1 + eps)
 assert 0.0771462 / (1 + eps) <= pd('l0', 's1') <= 0.0771462 * (1 + eps)
 assert 0.3044822 / (1 + eps) <= pd('l1', 's0') <= 0.3044822 * (1 + eps)
 assert 0.1978538 / (1 + eps) <= pd('l1', 's1') <= 0.1978538 * (1 + eps)
+
+# Test the elimination ordering found by the Greedy Ordering algorithm
+# if no elimination ordering is set
+
+algorithm = BE(model)
+
+algorithm.set_query(difficulty)
+algorithm.set_evidence((letter, 'l0'), (sat, 's0'))
+algorithm.run()
+pd = algorithm.pd
+algorithm.print_pd()
+# Assertion values were obtained using BPA
+assert 0.4742196406430358 / (1 + eps) <= pd('d0') <= 0.4742196406430358 * (1 + eps)
+assert 0.5257803593569642 / (1 + eps) <= pd('d1') <= 0.5257803593569642 * (1 + eps)
+
+algorithm.set_query(grade)
+algorithm.set_evidence(None)
+algorithm.run()
+pd = algorithm.pd
+algorithm.print_pd()
+assert 0.362 / (1 + eps) <= pd('g0') <= 0.362 * (1 + eps)
+assert 0.2884 / (1 + eps) <= pd('g1') <= 0.2884 * (1 + eps)
+assert 0.3496 / (1 + eps) <= pd('g2') <= 0.3496 * (1 + eps)
+
+# Test the greedy elimination ordering on a model with
+# a non-evidential variable having a one-value domain
+a = Variable(domain={'a0', 'a1'}, name='A')
+b = Variable(domain={'b0'}, name='B')
+c = Variable(domain={'c0', 'c1'}, name='C')
+f_ab = Factor(variables=(a, b), function=lambda a_val, b_val: 0.7 if a_val == 'a0' else 0.3, name='f_AB')
+f_bc = Factor(variables=(b, c), function=lambda b_val, c_val: 0.4 if c_val == 'c0' else 0.6, name='f_BC')
+algorithm = BE(FactorGraph(factors=(f_ab, f_bc)))
+
+algorithm.set_query(a)
+algorithm.run()
+pd = algorithm.pd
+algorithm.print_pd()
+assert 0.7 / (1 + eps) <= pd('a0') <= 0.7 * (1 + eps)
+assert 0.3 / (1 + eps) <= pd('a1') <= 0.3 * (1 + eps)
@@ -0,0 +1,53 @@
+import pathlib
+import sys
+
+# Get the package directory
+package_dir = str(pathlib.Path(__file__).resolve().parents[3])
+# Add the package directory into sys.path if necessary
+if package_dir not in sys.path:
+    sys.path.insert(0, package_dir)
+
+from pyb4ml.inference import BP
+from pyb4ml.models import Misconception
+
+
+# Test the Belief Propagation algorithm on the loopy Misconception model
+# where the only loop passes through an evidential variable
+# Only the correctness of algorithms is tested!
+model = Misconception()
+alice = model.get_variable('Alice')
+bob = model.get_variable('Bob')
+charles = model.get_variable('Charles')
+debbie = model.get_variable('Debbie')
+
+eps = 1e-12
+
+algorithm = BP(model)
+algorithm.set_query(alice)
+algorithm.set_evidence((bob, 'b0'))
+algorithm.run(print_info=True)
+pd = algorithm.pd
+algorithm.print_pd()
+# P(a|b0)
+# = f_ab(a,b0) * (\sum_{c,d} f_bc(b0,c) * f_cd(c,d) * f_da(d,a))
+# / (\sum_{a} f_ab(a,b0) * (\sum_{c,d} f_bc(b0,c) * f_cd(c,d) * f_da(d,a)))
+#
+# f_ab(a0,b0) * (\sum_{c,d} f_bc(b0,c) * f_cd(c,d) * f_da(d,a0))
+# = 30 * (100 * (1 * 100 + 100 * 1) + 1 * (100 * 100 + 1 * 1)) = 30 * 30001 = 900030
+#
+# f_ab(a1,b0) * (\sum_{c,d} f_bc(b0,c) * f_cd(c,d) * f_da(d,a1))
+# = 1 * (100 * (1 * 1 + 100 * 100) + 1 * (100 * 1 + 1 * 100)) = 1000300
+# =>
+# P(a0|b0) = 900030 / 1900330 = 0.4736177400767235
+# P(a1|b0) = 1000300 / 1900330 = 0.5263822599232765
+assert 0.4736177400767235 / (1 + eps) <= pd('a0') <= 0.4736177400767235 * (1 + eps)
+assert 0.5263822599232765 / (1 + eps) <= pd('a1') <= 0.5263822599232765 * (1 + eps)
+
+# Without the evidence, the loop cannot be cut
+algorithm.set_evidence(None)
+try:
+    algorithm.run()
+except ValueError:
+    pass
+else:
+    assert False, 'BP must not run on a loop without evidential variables'
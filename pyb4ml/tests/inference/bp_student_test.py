@@ -160,6 +160,18 @@ algorithm.print_pd()
 assert 0.77371419413 / (1 + eps) <= pd('d0') <= 0.77371419413 * (1 + eps)
 assert 0.22628580587 / (1 + eps) <= pd('d1') <= 0.22628580587 * (1 + eps)
 
+# The same evidence given in another order uses the same cached messages
+cached_messages = algorithm._evidence_factor_to_variable_messages
+cached_evidences_number = len(algorithm._factor_to_variable_messages)
+algorithm.set_evidence((sat, 's0'), (letter, 'l1'))
+algorithm.run()
+assert algorithm._evidence_factor_to_variable_messages is cached_messages
+assert len(algorithm._factor_to_variable_messages) == cached_evidences_number
+pd = algorithm.pd
+algorithm.print_pd()
+assert 0.77371419413 / (1 + eps) <= pd('d0') <= 0.77371419413 * (1 + eps)
+assert 0.22628580587 / (1 + eps) <= pd('d1') <= 0.22628580587 * (1 + eps)
+
 # P(d,l1,s1) = P(d) * (
 # P(i0) * P(s1|i0) * (P(g0|d,i0) * P(l1|g0) + P(g1|d,i0) * P(l1|g1) + P(g2|d,i0) * P(l1|g2)) +
 # P(i1) * P(s1|i1) * (P(g0|d,i1) * P(l1|g0) + P(g1|d,i1) * P(l1|g1) + P(g2|d,i1) * P(l1|g2)))
@@ -295,3 +307,46 @@ pd = algorithm.pd
 algorithm.print_pd()
 assert 0.474219640643 / (1 + eps) <= pd('d0') <= 0.474219640643 * (1 + eps)
 assert 0.525780359357 / (1 + eps) <= pd('d1') <= 0.525780359357 * (1 + eps)
+
+# Test single-precision messages
+
+algorithm = BP(model, typecode='f')
+single_eps = 1e-6
+algorithm.set_query(difficulty)
+algorithm.set_evidence((letter, 'l0'), (sat, 's0'))
+algorithm.run()
+pd = algorithm.pd
+algorithm.print_pd()
+assert 0.474219640643 / (1 + single_eps) <= pd('d0') <= 0.474219640643 * (1 + single_eps)
+assert 0.525780359357 / (1 + single_eps) <= pd('d1') <= 0.525780359357 * (1 + single_eps)
+
+# Test a batch of evidences
+
+algorithm = BP(model)
+algorithm.set_query(difficulty)
+algorithm.set_evidence((sat, 's0'))
+algorithm.run()
+pd_d0 = algorithm.pd('d0')
+pds = algorithm.run_batch([((letter, 'l0'), (sat, 's1')), ((letter, 'l1'), ), None])
+# The evidence and distribution set before the batch are restored
+assert tuple((var.name, var.domain[0]) for var in algorithm.evidential) == (('SAT', 's0'), )
+assert algorithm.pd('d0') == pd_d0
+assert 0.397248341461 / (1 + eps) <= pds[0]('d0') <= 0.397248341461 * (1 + eps)
+assert 0.602751658539 / (1 + eps) <= pds[0]('d1') <= 0.602751658539 * (1 + eps)
+assert 0.736431392534 / (1 + eps) <= pds[1]('d0') <= 0.736431392534 * (1 + eps)
+assert 0.263568607466 / (1 + eps) <= pds[1]('d1') <= 0.263568607466 * (1 + eps)
+assert 0.6 / (1 + eps) <= pds[2]('d0') <= 0.6 * (1 + eps)
+assert 0.4 / (1 + eps) <= pds[2]('d1') <= 0.4 * (1 + eps)
+
+# The evidence and distribution set before the batch are also restored if a run fails
+for evidences in ([((letter, 'l0'), ), ((letter, 'bogus'), )], [((difficulty, 'd0'), )]):
+    try:
+        algorithm.run_batch(evidences)
+    except ValueError:
+        pass
+    else:
+        assert False, 'the batch must fail'
+    assert tuple((var.name, var.domain[0]) for var in algorithm.evidential) == (('SAT', 's0'), )
+    assert algorithm.pd('d0') == pd_d0
+algorithm.run()
+assert algorithm.pd('d0') == pd_d0